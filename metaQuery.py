@@ -2,98 +2,157 @@
 
 import streamlit as st            # Streamlit for web app
 import pandas as pd               # Pandas for data manipulation
+import numpy as np                # NumPy for vectorized array operations
 import io                         # IO for in-memory file operations
 import re                         # Regular expressions for text processing
-import base64                     # Base64 for encoding files for download
+import functools                  # Functools for memoizing compiled patterns
+
+CSV_CHUNK_ROWS = 200_000                  # Rows per chunk when reading CSV uploads
+GROUPS_PER_PAGE = 50                      # Parent groups rendered per page of the preview table
+
+# Precompiled patterns for text normalization and search
+# One pass: group 1 is a run of whitespace/underscores/hyphens (collapsed to one space),
+# otherwise a special character other than parentheses and slashes (removed)
+_RE_NORMALIZE = re.compile(r"([\s_\-]+)|[^\w\s()/]")
+_RE_REGEX_META = re.compile(r"[.^$*+?{}\[\]\\|()]")   # Characters that make a search query a regex
+_MARK_TEMPLATE = r"<mark>\g<0></mark>"     # Highlight replacement, expanded by re without a Python callback
 
 # Helper functions
-@st.cache_data
+# Cached as a shared resource to skip pickling the frame on every hit; the upload is
+# keyed on its metadata instead of its bytes, and callers must not mutate the result.
+# Every upload gets a fresh file_id, so the cache is bounded to keep it from growing
+@st.cache_resource(
+    max_entries=16,
+    ttl=3600,
+    show_spinner=False,
+    hash_funcs={"streamlit.runtime.uploaded_file_manager.UploadedFile": lambda f: (f.file_id, f.name, f.size)},
+)
 def load_file(file) -> pd.DataFrame:
     if file.name.endswith(".csv"):
-        df = pd.read_csv(file)
+        # Read CSVs in chunks, tagging each one as it arrives, to cap peak memory
+        chunks = [chunk.assign(Source_File=file.name) for chunk in pd.read_csv(file, chunksize=CSV_CHUNK_ROWS)]
+        return pd.concat(chunks, ignore_index=True)
     elif file.name.endswith((".xlsx", ".xls")):
-        df = pd.read_excel(file)
+        df = pd.read_excel(file)      # Excel workbooks can't be streamed; read in one shot
     else:
         raise ValueError("Unsupported file format. Please upload CSV or Excel.")
     df["Source_File"] = file.name
     return df
 
+# Replacement for each _RE_NORMALIZE match
+def _normalize_match(m: re.Match) -> str:
+    return " " if m.group(1) else ""
+
 # Text normalization function for deduplication
 def normalize_text(text: str) -> str:
     if not isinstance(text, str):
         return text 
     text = text.lower().strip()              # Lowercase and trim
-    text = re.sub(r"[_\-]+", " ", text)      # Replace underscores/hyphens with space
-    text = re.sub(r"\s+", " ", text)         # Collapse multiple spaces
-    text = re.sub(r"[^\w\s()/]", "", text)   # Remove special characters except parentheses and slashes
-    return text
+    return _RE_NORMALIZE.sub(_normalize_match, text)   # Collapse separators, drop special characters
+
+# Integer deduplication keys for a text column: rows share a code exactly when their
+# normalized text matches (missing values get -1). Metadata values repeat heavily, so
+# each distinct value is normalized once and no per-row normalized strings are built
+def normalized_codes(s: pd.Series) -> np.ndarray:
+    codes, uniques = pd.factorize(s.astype("string"))
+    norm_codes, _ = pd.factorize(pd.array([normalize_text(u) for u in uniques], dtype="string"))
+    return np.append(norm_codes, -1)[codes]     # code -1 picks the trailing -1
 
 # Global text search across all string columns
 def text_search(df: pd.DataFrame, query: str) -> pd.DataFrame:
     if not query:
         return df
+    text_cols = df.select_dtypes(include=["object", "string"]).columns
+    regex = _RE_REGEX_META.search(query) is not None    # Plain substrings skip the regex engine
     mask = pd.Series(False, index=df.index)
-    for col in df.select_dtypes(include=["object", "string"]):
-        mask |= df[col].astype(str).str.contains(query, case=False, na=False)
+    for col in text_cols:
+        mask |= df[col].astype(str).str.contains(query, case=False, regex=regex, na=False)
     return df[mask]
 
-# Cell formatting with search term highlighting
-def format_cell(value, search_term=None) -> str:
-    if pd.isna(value) or str(value).strip().lower() in ["", "nan", "na", "none"]:
-        return "<span style='color:red;'>No Definition</span>"
-    text = str(value)
-    if search_term:
-        pattern = re.compile(re.escape(search_term), re.IGNORECASE)
-        text = pattern.sub(lambda m: f"<mark>{m.group(0)}</mark>", text)
-    return text
-
-# Redesigned HTML table
-def generate_parent_grouped_html(df: pd.DataFrame, search_term=None) -> str:
+# Compiled highlight pattern for a search term, reused across calls
+@functools.lru_cache(maxsize=16)
+def highlight_pattern(search_term: str) -> re.Pattern:
+    return re.compile(re.escape(search_term), re.IGNORECASE)
+
+# Vectorized cell formatting over a whole column: blank/NA-like cells show a red
+# "No Definition", others show their text with search matches wrapped in <mark>
+def format_series(values: pd.Series, pattern=None) -> pd.Series:
+    text = values.astype(str)
+    missing = values.isna() | text.str.strip().str.lower().isin(["", "nan", "na", "none"])
+    if pattern is not None:
+        text = text.str.replace(pattern, _MARK_TEMPLATE, regex=True)
+    return text.mask(missing, "<span style='color:red;'>No Definition</span>")
+
+# Cache key for pandas arguments: pandas' own row hashing over every row
+def _hash_pandas(obj):
+    labels = tuple(obj.columns) if isinstance(obj, pd.DataFrame) else obj.name
+    return labels, pd.util.hash_pandas_object(obj, index=False).values.tobytes()
+
+# Redesigned HTML table, memoized so reruns with unchanged rows and search term reuse it
+@st.cache_data(max_entries=8, show_spinner=False, hash_funcs={pd.DataFrame: _hash_pandas, pd.Series: _hash_pandas})
+def generate_parent_grouped_html(df: pd.DataFrame, group_keys: pd.Series, search_term=None,
+                                 page: int = 1, page_size: int = GROUPS_PER_PAGE) -> str:
     parent_col = df.columns[0]
     child_cols = df.columns[1:]
 
-    html = "<table border='1' style='border-collapse:collapse; width:100%; text-align:left;'>"
-    html += "<tr>"
+    parts = ["<table border='1' style='border-collapse:collapse; width:100%; text-align:left;'>", "<tr>"]
 
     # Table headers with custom widths
     for i, c in enumerate([parent_col] + list(child_cols)):
         if i == 0:
-            html += f"<th style='width:20%'>{c}</th>"
+            parts.append(f"<th style='width:20%'>{c}</th>")
         elif i == 1:
-            html += f"<th style='width:30%'>{c}</th>"
+            parts.append(f"<th style='width:30%'>{c}</th>")
         elif i == 3:
-            html += f"<th style='width:50%'>{c}</th>"
+            parts.append(f"<th style='width:50%'>{c}</th>")
         else:
-            html += f"<th>{c}</th>"
-    html += "</tr>"
-
-    # Case-insensitive grouping
-    df["_group_key"] = df[parent_col].astype(str).str.lower()
-    grouped = df.groupby("_group_key", sort=False)
-
-    for _, group in grouped:
-        rowspan = group.shape[0]
-        original_parent = group.iloc[0][parent_col]
-        for i, (_, row) in enumerate(group.iterrows()):
-            html += "<tr>"
+            parts.append(f"<th>{c}</th>")
+    parts.append("</tr>")
+
+    # Case-insensitive grouping by row position; group_keys is aligned row-for-row with df
+    groups = list(group_keys.groupby(group_keys, sort=False, dropna=False).indices.values())
+    groups = groups[page_size * (page - 1):page_size * page]    # Only the requested page
+
+    # Format the visible rows up front, compiling the highlight pattern once;
+    # the page's groups are laid out back to back in page_df
+    pattern = highlight_pattern(search_term) if search_term else None
+    page_df = df.iloc[np.concatenate(groups)] if groups else df.iloc[0:0]
+    parent_cells = format_series(page_df[parent_col], pattern).to_numpy()
+    child_cells = [format_series(page_df[c], pattern).to_numpy() for c in child_cols]
+
+    start = 0
+    for idx in groups:
+        rowspan = len(idx)
+        for i, r in enumerate(range(start, start + rowspan)):
+            parts.append("<tr>")
             if i == 0:
-                parent_value = format_cell(original_parent, search_term)
-                html += f"<td rowspan='{rowspan}' style='vertical-align: top; font-weight:bold;'>{parent_value}</td>"
-            for j, c in enumerate(child_cols):
-                cell_value = format_cell(row[c], search_term)
+                parts.append(f"<td rowspan='{rowspan}' style='vertical-align: top; font-weight:bold;'>{parent_cells[r]}</td>")
+            for j, cells in enumerate(child_cells):
                 if j == 0:
-                    html += f"<td style='width:30%'>{cell_value}</td>"
+                    parts.append(f"<td style='width:30%'>{cells[r]}</td>")
                 elif j == 2:  # 4th column (0-indexed)
-                    html += f"<td style='width:50%'>{cell_value}</td>"
+                    parts.append(f"<td style='width:50%'>{cells[r]}</td>")
                 else:
-                    html += f"<td>{cell_value}</td>"
-            html += "</tr>"
-    html += "</table>"
+                    parts.append(f"<td>{cells[r]}</td>")
+            parts.append("</tr>")
+        start += rowspan
+    parts.append("</table>")
+    return "".join(parts)
 
-    df.drop(columns=["_group_key"], inplace=True)
-    return html
+# Single-row export workbook, memoized on the selected values so reruns don't rebuild it
+@st.cache_data(max_entries=8, show_spinner=False)
+def build_export_workbook(values: tuple) -> bytes:
+    col_data = pd.DataFrame([list(values)])
+    towrite = io.BytesIO()
+    with pd.ExcelWriter(towrite, engine="xlsxwriter") as writer:
+        col_data.to_excel(writer, sheet_name="SelectedColumn", index=False, header=False)
+    return towrite.getvalue()
 
 # Streamlit App
+# Copy-on-write lets the frames derived below share memory until written (always on in pandas >= 3)
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
 st.set_page_config(page_title="MetaQuery: Grouped Preview", layout="wide")
 st.title("MetaQuery: For Metadata Schema Exploration")
 
@@ -102,25 +161,27 @@ uploaded_files = st.file_uploader(
 )
 
 if uploaded_files:
+    # The cached frames are only read here; concat builds the one working frame
     dfs = [load_file(file) for file in uploaded_files]
-    df_original = pd.concat(dfs, ignore_index=True)
-    df_working = df_original.copy()
+    df_working = pd.concat(dfs, ignore_index=True)
     total_before = df_working.shape[0]
 
-    # Deduplication
-    normalized_df = df_working.copy()
-    for col in normalized_df.select_dtypes(include=["object", "string"]).columns:
-        normalized_df[col] = normalized_df[col].astype(str).apply(normalize_text)
+    # Case-folded parent keys, computed once and shared by every grouped view below;
+    # missing parents stay <NA>, so each groupby keeps them as a group with dropna=False
+    group_keys = df_working.iloc[:, 0].astype("string").str.casefold()
 
-    if normalized_df.shape[1] > 1:
-        second_col = normalized_df.columns[1]
-        duplicates_mask = normalized_df.duplicated(subset=[second_col], keep="first")
+    # Deduplication on the second column, normalized only if it holds text
+    if df_working.shape[1] > 1:
+        dedup_key = df_working.iloc[:, 1]
+        if pd.api.types.is_object_dtype(dedup_key) or pd.api.types.is_string_dtype(dedup_key):
+            dedup_key = pd.Series(normalized_codes(dedup_key))
+        duplicates_mask = dedup_key.duplicated(keep="first").to_numpy()
         keep_mask = ~duplicates_mask
-        df = df_working[keep_mask].copy()
-        removed_df = df_working[duplicates_mask].copy()
+        df = df_working[keep_mask]
+        removed_df = df_working[duplicates_mask]
     else:
         st.warning("Dataset has only one column; skipping second-column deduplication.")
-        df = df_working.copy()
+        df = df_working
         removed_df = pd.DataFrame()
 
     total_after = df.shape[0]
@@ -132,18 +193,16 @@ if uploaded_files:
     if not removed_df.empty:
         st.subheader("🗑️ Removed (Deduplicated) Rows")
         with st.expander(f"Show all removed rows (Total: {len(removed_df)})", expanded=False):
-            removed_df["_group_key"] = removed_df.iloc[:, 0].astype(str).str.lower()
-            grouped_removed = removed_df.groupby("_group_key", sort=False)
+            grouped_removed = removed_df.groupby(group_keys.loc[removed_df.index], sort=False, dropna=False)
             for _, group in grouped_removed:
                 display_key = group.iloc[0, 0]
                 with st.expander(f"{group.columns[0]}: {display_key} (Count: {len(group)})", expanded=False):
-                    st.dataframe(group.drop(columns=["_group_key"]), use_container_width=True)
-            removed_df.drop(columns=["_group_key"], inplace=True)
+                    st.dataframe(group, use_container_width=True)
 
     # Global Search
     st.subheader("Global Search")
     global_search = st.text_input("Search across all text columns:")
-    filtered_df = df.copy()
+    filtered_df = df
     if global_search:
         filtered_df = text_search(filtered_df, global_search)
     display_cols = [c for c in filtered_df.columns if c not in ["Source_File"]]
@@ -151,7 +210,18 @@ if uploaded_files:
 
     # Grouped Table Preview
     st.subheader("Filtered Data Preview")
-    grouped_html = generate_parent_grouped_html(filtered_df, search_term=global_search)
+    filtered_keys = group_keys.loc[filtered_df.index]
+    total_groups = filtered_keys.nunique(dropna=False)
+    page_col, size_col = st.columns(2)
+    page_size = size_col.number_input("Groups per page", min_value=1, value=GROUPS_PER_PAGE, step=10)
+    total_pages = max(1, -(-total_groups // page_size))
+    page = page_col.number_input("Page", min_value=1, max_value=total_pages, value=1, step=1)
+    first_group = page_size * (page - 1)
+    st.caption(f"Showing groups {min(first_group + 1, total_groups)}–{min(first_group + page_size, total_groups)} "
+               f"of {total_groups} (page {page} of {total_pages})")
+    grouped_html = generate_parent_grouped_html(
+        filtered_df, filtered_keys, search_term=global_search, page=page, page_size=page_size
+    )
     st.markdown(grouped_html, unsafe_allow_html=True)
 
     # Master Expander for Remaining Rows with Checkboxes
@@ -159,8 +229,7 @@ if uploaded_files:
     editable_table = pd.DataFrame()
     if not filtered_df.empty:
         parent_col = filtered_df.columns[0]
-        filtered_df["_group_key"] = filtered_df[parent_col].astype(str).str.lower()
-        grouped_remaining = filtered_df.groupby("_group_key", sort=False)
+        grouped_remaining = filtered_df.groupby(filtered_keys, sort=False, dropna=False)
 
         editable_rows = []
 
@@ -168,14 +237,19 @@ if uploaded_files:
             for _, group in grouped_remaining:
                 original_parent = group.iloc[0][parent_col]
                 cols_to_hide = [parent_col] + [c for c in group.columns if "definition" in c.lower()]
-                display_group = group.drop(columns=cols_to_hide + ["_group_key"], errors="ignore").copy()
+                display_group = group.drop(columns=cols_to_hide, errors="ignore")
 
                 with st.expander(f"{parent_col}: {original_parent} (Count: {len(group)})", expanded=False):
-                    display_group["Select"] = False
-                    for i, (_, row) in enumerate(display_group.iterrows()):
-                        key = f"{original_parent}_{i}"
-                        display_group.at[row.name, "Select"] = st.checkbox(str(row.iloc[0]), key=key)
-                    editable_rows.append(display_group)
+                    # One editor per group with a checkbox column, instead of one widget per row
+                    display_group = display_group.assign(Select=False)
+                    edited = st.data_editor(
+                        display_group,
+                        key=f"ed_{original_parent}",
+                        hide_index=True,
+                        column_config={"Select": st.column_config.CheckboxColumn("Select", default=False)},
+                        disabled=[c for c in display_group.columns if c != "Select"],
+                    )
+                    editable_rows.append(edited)
 
         if editable_rows:
             editable_table = pd.concat(editable_rows, ignore_index=True)
@@ -199,28 +273,17 @@ if uploaded_files:
                 column_to_export = c
                 break
 
-    if column_to_export:
-        col_data = pd.DataFrame([final_filtered[column_to_export].dropna().tolist()]) if not final_filtered.empty else pd.DataFrame([[]])
+    if column_to_export and not final_filtered.empty:
+        export_values = tuple(final_filtered[column_to_export].dropna().tolist())
     else:
-        col_data = pd.DataFrame([[]])
+        export_values = ()
 
-    towrite = io.BytesIO()
-    with pd.ExcelWriter(towrite, engine="openpyxl") as writer:
-        col_data.to_excel(writer, sheet_name="SelectedColumn", index=False, header=False)
-    towrite.seek(0)
-
-    b64 = base64.b64encode(towrite.read()).decode()               
-    st.markdown(
-        f'''
-        <a href="data:application/vnd.openxmlformats-officedocument.spreadsheetml.sheet;base64,{b64}" 
-           download="new_meta_schema.xlsx" 
-           style="text-decoration:none; background-color:#1E90FF; color:white; padding:8px 16px; border-radius:4px;">
-           Download
-        </a>
-        ''',
-        unsafe_allow_html=True
+    st.download_button(
+        label="Download",
+        data=build_export_workbook(export_values),
+        file_name="new_meta_schema.xlsx",
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
     )
 
 else:
     st.info("Please upload at least one CSV or Excel file to get started.")
-metaQuery.app README.md